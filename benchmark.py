@@ -0,0 +1,260 @@
+"""
+Benchmark del extractor sobre formularios sintéticos.
+
+Genera N libros con las etiquetas que buscan los extractores (CALIFICACIÓN con
+fondo amarillo, CI: TITULAR, SCORE GARANTE, CUPO:, PROVEEDORES, ...), con
+posiciones, desplazamientos, filas de relleno y anexos aleatorios, y mide
+extraer_archivo y procesar_carpeta con varios tamaños de lote: archivos/s,
+latencia p50/p95 por archivo y pico de memoria (RSS). El resultado se guarda
+en JSON para comparar ejecuciones.
+
+    python benchmark.py --tamanos 10 50 200 --workers 1 4 --salida bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import openpyxl
+from openpyxl.styles import PatternFill
+
+try:
+    import resource
+except ImportError:  # Windows: sin RSS pico (las columnas se omiten)
+    resource = None
+from openpyxl.styles.colors import Color
+
+import ExtractorD
+
+AMARILLOS = [PatternFill('solid', start_color='FFFFFF00'),
+             PatternFill('solid', start_color='FFFFFFCC'),
+             PatternFill('solid', start_color=Color(indexed=13))]
+VERDE = PatternFill('solid', start_color='FF92D050')
+
+NOMBRES = ['Juan Perez', 'Maria Lopez', 'Carlos Andrade', 'Ana Vera', 'Luis Mora', 'Rosa Quispe']
+CIUDADES = ['QUITO', 'AMBATO', 'GUAYAQUIL', 'CUENCA', 'RIOBAMBA']
+VENDEDORES = ['Pato Cueva', 'Ana', 'Jorge Silva', 'Mercedes']
+
+
+def _cedula(rng):
+    return ''.join(rng.choice('0123456789') for _ in range(10))
+
+
+def generar_formulario(ruta, rng, filas_anexo=0):
+    """Escribe un formulario con el diseño del real y variaciones aleatorias."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    f = 1 + rng.randint(0, 4)   # Fila donde empieza el formulario
+    c = 1 + rng.randint(0, 2)   # Columna de las etiquetas
+
+    def fila(*celdas, relleno=None):
+        # Escribe etiqueta y valores a partir de la columna c; a veces deja filas en blanco
+        nonlocal f
+        for k, valor in enumerate(celdas):
+            if valor is not None:
+                ws.cell(f, c + k, valor)
+        if relleno:
+            ws.cell(f, c + len(celdas) - 1).fill = relleno
+        f += 1 + (rng.random() < 0.15)
+
+    ws.cell(1, 10 + rng.randint(0, 3), f"COD {rng.randint(10000, 99999)}")
+    fila('CALIFICACIÓN', None, rng.choice('ABC'), relleno=rng.choice(AMARILLOS))
+    ws.cell(f, c + 8, 'REVISADO')
+    ws.cell(f, c + 9, rng.choice(['CARPETA COMPLETA', 'INCOMPLETA'])).fill = AMARILLOS[0]
+    f += 2
+    fila('NOMBRE', f"{rng.choice(NOMBRES)} {rng.randint(1, 999)}")
+    fila('CI: TITULAR', _cedula(rng), 'EDAD', rng.randint(18, 90))
+    fila('CI: CONYUGUE', rng.choice([_cedula(rng), 'XXXXXX']))
+    fila('CI: GARANTE', rng.choice([_cedula(rng), 'N/A']))
+    fila('ESTADO CIVIL', rng.choice(['CASADO', 'SOLTERO', 'DIVORCIADO', 'UNION LIBRE']))
+    fila('RUC', _cedula(rng) + '001', 'AÑO', str(rng.randint(2000, 2024)))
+    fila('SCORE TITULAR', rng.randint(300, 999))
+    fila('SCORE CONYUGUE', str(rng.randint(300, 999)))
+    fila('SCORE GARANTE', f"{rng.randint(300, 999)} {rng.choice(['sin atraso', ''])}")
+    fila(f"GARANTIA: {rng.choice(['HIPOTECA', 'PRENDA', 'NINGUNA'])}")
+    fila('FIRMA CON:', rng.choice(['CONYUGE', 'GARANTE']))
+    fila('GARANTE:', rng.choice(['XXXXXX', 'SI', rng.choice(NOMBRES)]))
+    fila('CONTRATO DE PROV:', rng.choice(['SI', 'NO']))
+    fila('MATRICULA VEHICULO', rng.choice(['NO', f"GSB-{rng.randint(1000, 9999)}"]))
+    fila('COPIA PAGOS PREDIALES', rng.choice(['SI', 'NO']))
+    fila('FUNCION JUDICIAL TITULAR', rng.choice(['NO REGISTRA', 'PENDIENTE JUICIO']))
+    fila('FUNCION JUDICIAL CÓNYUGUE', rng.choice(['NO REGISTRA', 'PENDIENTE JUICIO']))
+    fila('BANCO', rng.choice(['PICHINCHA', 'GUAYAQUIL', 'PACIFICO']), 'CUENTA', str(rng.randint(10**9, 10**10 - 1)))
+    fila('CUPO:', f"$ {rng.randint(300, 20000)}.{rng.randint(0, 99):02d}")
+    fila('CLIENTE DESDE')
+    fila(f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(2000, 2024)}")
+    fila('VENCIDA:', round(rng.uniform(0, 2000), 2))
+    fila('POR VENCER', f"$ {rng.randint(0, 5000)}")
+    fila('DOCUMENTADO', rng.randint(0, 10000))
+    fila('RIESGO TOTAL', rng.randint(0, 30000))
+    fila('RIESGO TOTAL MAS ALTO', rng.randint(0, 30000))
+    fila('RIESGO TOTAL ACTUAL', rng.randint(0, 30000))
+    fila(f"COTIZACIÓN: {rng.randint(100, 5000)}")
+    if rng.random() < 0.5:
+        fila(f"VENDEDOR: {rng.choice(VENDEDORES)} CIUDAD: {rng.choice(CIUDADES)}")
+    else:
+        fila(f"VENDEDOR: {rng.choice(VENDEDORES)}", None, None, f"CIUDAD: {rng.choice(CIUDADES)}")
+    f += rng.randint(0, 3)
+    fila('PROVEEDORES')
+    for _ in range(rng.randint(1, 4)):
+        fila(f"EMPRESA {rng.randint(1, 500)}")
+    fila('IESS', rng.choice(['N/T', 'AFILIADO']))
+    fila('SRI', rng.choice(['ACTIVO', 'SUSPENDIDO']))
+    fila('OBSERVACIÓN', rng.choice(['cliente puntual', 'revisar referencias']))
+    fila('APROBADO POR', rng.choice(['Gerente', 'Comité']))
+    ws.cell(f, c + 6, 'visto').fill = VERDE
+
+    # Anexo (detalle de movimientos) y al final las cotizaciones por producto
+    f += 2
+    for k in range(filas_anexo):
+        ws.cell(f + k, 3, f"anexo {k}")
+        ws.cell(f + k, 4, round(k * 1.5, 2))
+    f += filas_anexo
+    for producto in rng.sample(['LLANTAS', 'AROS', 'LUBRICANTES', 'BATERÍAS'], rng.randint(1, 4)):
+        fila(producto, f"$ {rng.randint(20, 900)}")
+    wb.save(ruta)
+
+
+def generar_corpus(carpeta, n, semilla=1, anexos=(0, 0, 0, 200, 2000)):
+    """Genera n formularios form_XXXXX.xlsx en la carpeta (se reutilizan si ya existen)."""
+    carpeta = Path(carpeta)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(semilla)
+    archivos = []
+    for i in range(n):
+        ruta = carpeta / f"form_{i:05d}.xlsx"
+        filas_anexo = rng.choice(anexos)
+        semilla_archivo = rng.random()
+        if not ruta.exists():
+            generar_formulario(ruta, random.Random(semilla_archivo), filas_anexo)
+        archivos.append(ruta)
+    return archivos
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return None
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _rss_pico_mb(hijos=False):
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN if hijos else resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _medir(modo, carpeta, n, workers, lector, cola):
+    """Corre un escenario en un proceso nuevo (el pico de RSS es por proceso)."""
+    archivos = sorted(Path(carpeta).glob('*.xlsx'))[:n]
+    extractor = ExtractorD.ExtractorFormulariosCompleto(carpeta, lector=lector)
+    resultado = {'modo': modo, 'archivos': len(archivos), 'workers': workers, 'lector': lector}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if modo == 'extraer_archivo':
+            latencias = []
+            inicio = time.perf_counter()
+            for archivo in archivos:
+                t = time.perf_counter()
+                extractor.extraer_archivo(archivo)
+                latencias.append(time.perf_counter() - t)
+            total = time.perf_counter() - inicio
+            resultado['latencia_p50_ms'] = round(_percentil(latencias, 50) * 1000, 2)
+            resultado['latencia_p95_ms'] = round(_percentil(latencias, 95) * 1000, 2)
+        else:
+            # procesar_carpeta recorre toda la carpeta: se usa una con sólo n archivos
+            inicio = time.perf_counter()
+            registros = extractor.procesar_carpeta(workers=workers)
+            total = time.perf_counter() - inicio
+            resultado['registros'] = len(registros)
+
+    resultado['segundos'] = round(total, 3)
+    resultado['archivos_por_segundo'] = round(len(archivos) / total, 2) if total else None
+    if resource is not None:
+        resultado['rss_pico_mb'] = _rss_pico_mb()
+        resultado['rss_pico_hijos_mb'] = _rss_pico_mb(hijos=True)
+    cola.put(resultado)
+
+
+def medir(modo, carpeta, n, workers=1, lector='openpyxl'):
+    contexto = multiprocessing.get_context('spawn')
+    cola = contexto.Queue()
+    proceso = contexto.Process(target=_medir, args=(modo, str(carpeta), n, workers, lector, cola))
+    proceso.start()
+    resultado = cola.get()
+    proceso.join()
+    return resultado
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ejecutar(tamanos, workers, lector='openpyxl', semilla=1, carpeta=None, salida=None):
+    """Genera los corpus, mide todos los escenarios y guarda el JSON."""
+    base = Path(carpeta or tempfile.mkdtemp(prefix='bench_extractor_'))
+    corpus = base / f"corpus_{semilla}"
+    generar_corpus(corpus, max(tamanos), semilla)
+
+    escenarios = []
+    for n in tamanos:
+        # Carpeta con exactamente n archivos (enlaces al corpus común)
+        carpeta_n = base / f"lote_{semilla}_{n}"
+        carpeta_n.mkdir(exist_ok=True)
+        for archivo in sorted(corpus.glob('*.xlsx'))[:n]:
+            destino = carpeta_n / archivo.name
+            if not destino.exists():
+                os.link(archivo, destino)
+
+        r = medir('extraer_archivo', carpeta_n, n, 1, lector)
+        print(f" extraer_archivo   n={n:<5} {r['archivos_por_segundo']:>8} arch/s  "
+              f"p50 {r['latencia_p50_ms']} ms  p95 {r['latencia_p95_ms']} ms"
+              + (f"  RSS {r['rss_pico_mb']} MB" if 'rss_pico_mb' in r else ''))
+        escenarios.append(r)
+        for w in workers:
+            r = medir('procesar_carpeta', carpeta_n, n, w, lector)
+            print(f" procesar_carpeta  n={n:<5} w={w:<3} {r['archivos_por_segundo']:>8} arch/s"
+                  + (f"  RSS {r['rss_pico_mb']} MB (+{r['rss_pico_hijos_mb']} MB hijos)" if 'rss_pico_mb' in r else ''))
+            escenarios.append(r)
+
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'semilla': semilla,
+        'escenarios': escenarios,
+    }
+    salida = Path(salida or f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    salida.write_text(json.dumps(informe, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f"\n Resultados: {salida}")
+    return informe
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[10, 50, 200],
+                        help='cantidades de archivos a medir')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1],
+                        help='workers para procesar_carpeta')
+    parser.add_argument('--lector', default='openpyxl', choices=['openpyxl', 'ooxml'])
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--carpeta', help='carpeta de trabajo (se reutiliza el corpus generado)')
+    parser.add_argument('--salida', help='archivo JSON de resultados')
+    args = parser.parse_args()
+    ejecutar(args.tamanos, args.workers, args.lector, args.semilla, args.carpeta, args.salida)
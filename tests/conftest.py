@@ -0,0 +1,33 @@
+"""
+Fixtures de las pruebas: formularios sintéticos generados con
+benchmark.generar_formulario (el mismo diseño que usa el benchmark).
+
+    python -m pytest -q
+"""
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import benchmark  # noqa: E402
+
+# Sin anexos largos salvo uno, para que la cola se recorra y las pruebas sigan siendo rápidas
+ANEXOS = (0, 0, 0, 200)
+
+
+@pytest.fixture(scope='session')
+def corpus(tmp_path_factory):
+    """Carpeta con 10 formularios sintéticos distintos (form_00000..form_00009.xlsx)."""
+    carpeta = tmp_path_factory.mktemp('corpus')
+    benchmark.generar_corpus(carpeta, 10, semilla=7, anexos=ANEXOS)
+    return carpeta
+
+
+def generar(ruta, semilla, filas_anexo=0):
+    """Un formulario sintético suelto, reproducible por semilla."""
+    benchmark.generar_formulario(ruta, random.Random(semilla), filas_anexo)
+    return ruta
@@ -0,0 +1,30 @@
+import csv
+
+import pytest
+
+from ExtractorD import ExtractorFormulariosCompleto, SalidaCSV
+
+
+class SalidaRota(SalidaCSV):
+    """Falla al escribir la segunda fila, con las etapas anteriores aún produciendo."""
+    
+    def _escribir_fila(self, fila):
+        if self.filas == 1:
+            raise OSError('disco lleno')
+        super()._escribir_fila(fila)
+
+
+def test_escritura_caida_cancela_el_pipeline(corpus, tmp_path):
+    extractor = ExtractorFormulariosCompleto(corpus)
+    with pytest.raises(OSError, match='disco lleno'):
+        extractor.extraer_canalizado(SalidaRota(tmp_path / 'salida.csv'), lectores=2,
+                                     analizadores=1, anticipados=1)
+
+
+def test_canalizado_escribe_todo_en_orden(corpus, tmp_path):
+    ruta = tmp_path / 'salida.csv'
+    extractor = ExtractorFormulariosCompleto(corpus)
+    extractor.extraer_canalizado(SalidaCSV(ruta), lectores=2, analizadores=1, anticipados=1)
+    with open(ruta, encoding='utf-8-sig', newline='') as f:
+        nombres = [fila['archivo_origen'] for fila in csv.DictReader(f)]
+    assert nombres == [archivo.name for archivo in extractor.listar_archivos()]
@@ -0,0 +1,66 @@
+import csv
+import shutil
+
+import pytest
+
+import ExtractorD
+from ExtractorD import ExtractorFormulariosCompleto, ManifiestoExtraccion, extraer_formularios
+
+
+@pytest.fixture
+def carpeta_con_copias(corpus, tmp_path):
+    """El corpus más dos copias byte a byte: una antes y otra después de su original."""
+    carpeta = tmp_path / 'copias'
+    shutil.copytree(corpus, carpeta)
+    shutil.copy(carpeta / 'form_00002.xlsx', carpeta / 'zz_copia2.xlsx')
+    shutil.copy(carpeta / 'form_00005.xlsx', carpeta / 'aa_copia5.xlsx')
+    return carpeta
+
+
+def leer_csv(ruta):
+    with open(ruta, encoding='utf-8-sig', newline='') as f:
+        return sorted(csv.DictReader(f), key=lambda fila: fila['archivo_origen'])
+
+
+ESPERADAS = {'archivo': 12, 'contenido': 10, 'todas': 12}
+# Archivos realmente extraídos (una fila por archivo en el informe de tiempos)
+EXTRAIDOS = {'archivo': 10, 'contenido': 10, 'todas': 12}
+
+
+@pytest.mark.parametrize('copias', ESPERADAS)
+@pytest.mark.parametrize('lectores', [0, 2], ids=['iterar_registros', 'canalizado'])
+def test_politica_de_copias(carpeta_con_copias, tmp_path, copias, lectores):
+    salida = tmp_path / 'salida.csv'
+    extraer_formularios(str(carpeta_con_copias), str(salida), workers=1, lectores=lectores,
+                        incremental=False, copias=copias)
+    filas = leer_csv(salida)
+    assert len(filas) == ESPERADAS[copias]
+    with open(salida.with_suffix('.tiempos.csv'), encoding='utf-8', newline='') as f:
+        assert len(list(csv.DictReader(f))) == EXTRAIDOS[copias]
+    nombres = {fila['archivo_origen'] for fila in filas}
+    if copias == 'contenido':
+        assert len(nombres & {'form_00002.xlsx', 'zz_copia2.xlsx'}) == 1
+    else:
+        por_nombre = {fila['archivo_origen']: fila for fila in filas}
+        copia = dict(por_nombre['zz_copia2.xlsx'], archivo_origen=None)
+        assert copia == dict(por_nombre['form_00002.xlsx'], archivo_origen=None)
+
+
+def test_caminos_dan_la_misma_salida(carpeta_con_copias, tmp_path):
+    secuencial, canalizado = tmp_path / 'a.csv', tmp_path / 'b.csv'
+    extraer_formularios(str(carpeta_con_copias), str(secuencial), workers=2, incremental=False)
+    extraer_formularios(str(carpeta_con_copias), str(canalizado), workers=2, lectores=2, incremental=False)
+    assert leer_csv(secuencial) == leer_csv(canalizado)
+
+
+def test_manifiesto_sin_cambios_no_se_vuelve_a_leer(carpeta_con_copias, tmp_path, monkeypatch):
+    manifiesto = ManifiestoExtraccion(tmp_path / 'manifiesto.jsonl')
+    extractor = ExtractorFormulariosCompleto(carpeta_con_copias, copias='archivo')
+    assert len(list(extractor.iterar_registros(workers=1, manifiesto=manifiesto))) == 12
+    
+    leidos = []
+    original = ExtractorD.hash_contenido
+    monkeypatch.setattr(ExtractorD, 'hash_contenido',
+                        lambda archivo, *args, **kwargs: leidos.append(archivo) or original(archivo, *args, **kwargs))
+    assert len(list(extractor.iterar_registros(workers=1, manifiesto=manifiesto))) == 12
+    assert leidos == []
@@ -0,0 +1,24 @@
+import zipfile
+
+import openpyxl
+
+from conftest import generar
+from ExtractorD import estimar_costo
+
+
+def test_costo_cuenta_solo_la_hoja_activa(tmp_path):
+    ruta = generar(tmp_path / 'f.xlsx', semilla=2)
+    antes = estimar_costo(ruta)
+    
+    wb = openpyxl.load_workbook(ruta)
+    anexo = wb.create_sheet('ANEXO')
+    for fila in range(1, 2001):
+        anexo.append([fila, 'x' * 20, fila * 1.5])
+    wb.save(ruta)
+    with zipfile.ZipFile(ruta) as z:
+        assert z.getinfo('xl/worksheets/sheet2.xml').file_size > antes[0]
+    assert estimar_costo(ruta)[0] == antes[0]
+    
+    wb.active = 1
+    wb.save(ruta)
+    assert estimar_costo(ruta)[0] > 10 * antes[0]
@@ -0,0 +1,44 @@
+import openpyxl
+
+from conftest import generar
+from ExtractorD import CuarentenaArchivos, ExtractorFormulariosCompleto
+
+
+def test_formulario_sin_nombre_se_extrae(tmp_path):
+    ruta = generar(tmp_path / 'sin_nombre.xlsx', semilla=3)
+    wb = openpyxl.load_workbook(ruta)
+    ws = wb.active
+    celda = next(c for fila in ws.iter_rows() for c in fila if c.value == 'NOMBRE')
+    celda.value = ws.cell(celda.row, celda.column + 1).value = None
+    wb.save(ruta)
+    
+    extractor = ExtractorFormulariosCompleto(tmp_path)
+    reg = extractor.extraer_archivo(ruta)
+    assert reg is not None and reg['NOMBRE'] is None
+    assert extractor.ultimos_tiempos.error is None
+
+
+def test_error_se_omite_tras_fallos_seguidos(tmp_path):
+    archivo = generar(tmp_path / 'f.xlsx', semilla=1)
+    cuarentena = CuarentenaArchivos(tmp_path / 'cuarentena.jsonl')
+    assert not cuarentena.guardar(archivo, 'error', 'TypeError: x')
+    assert cuarentena.buscar(archivo) is None
+    assert cuarentena.guardar(archivo, 'error', 'TypeError: x')
+    cuarentena.cerrar()
+    # Los fallos se cuentan también entre ejecuciones
+    assert CuarentenaArchivos(tmp_path / 'cuarentena.jsonl').buscar(archivo)['fallos'] == 2
+
+
+def test_otras_causas_se_omiten_de_inmediato(tmp_path):
+    archivo = generar(tmp_path / 'f.xlsx', semilla=1)
+    cuarentena = CuarentenaArchivos(tmp_path / 'cuarentena.jsonl')
+    assert cuarentena.guardar(archivo, 'tiempo', 'superó 5 s')
+    assert cuarentena.buscar(archivo)['causa'] == 'tiempo'
+
+
+def test_version_nueva_descarta_la_cuarentena(tmp_path):
+    archivo = generar(tmp_path / 'f.xlsx', semilla=1)
+    cuarentena = CuarentenaArchivos(tmp_path / 'cuarentena.jsonl', version='viejo')
+    cuarentena.guardar(archivo, 'tiempo', 'superó 5 s')
+    cuarentena.cerrar()
+    assert CuarentenaArchivos(tmp_path / 'cuarentena.jsonl').buscar(archivo) is None
@@ -0,0 +1,91 @@
+import datetime
+import io
+import contextlib
+import json
+import shutil
+from pathlib import Path
+
+import openpyxl
+import pytest
+
+from conftest import generar
+from ExtractorD import ExtractorFormulariosCompleto, extraer_formularios, leer_salida, ruta_cuarentena, tipo_libro
+
+
+def sin_origen(reg):
+    return {k: v for k, v in reg.items() if k != 'archivo_origen'}
+
+
+def extraer(carpeta, archivo):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return ExtractorFormulariosCompleto(carpeta).extraer_archivo(archivo)
+
+
+def convertir_a_xls(origen, destino):
+    """Guarda la hoja activa de un .xlsx como .xls (BIFF) con xlwt, con valores y rellenos sólidos."""
+    xlwt = pytest.importorskip('xlwt')
+    hoja = openpyxl.load_workbook(origen).active
+    libro = xlwt.Workbook()
+    salida = libro.add_sheet('Hoja1')
+    estilos, paleta = {}, {}
+    for fila in hoja.iter_rows():
+        for celda in fila:
+            relleno = celda.fill
+            rgb = (relleno.start_color.rgb[-6:]
+                   if relleno and relleno.fill_type == 'solid' and relleno.start_color.type == 'rgb' else None)
+            fecha = isinstance(celda.value, (datetime.date, datetime.datetime))
+            if celda.value is None and rgb is None:
+                continue
+            if (rgb, fecha) not in estilos:
+                estilo = xlwt.XFStyle()
+                if rgb:
+                    if rgb not in paleta:
+                        paleta[rgb] = 8 + len(paleta)
+                        xlwt.add_palette_colour(f'c{rgb}', paleta[rgb])
+                        libro.set_colour_RGB(paleta[rgb], *bytes.fromhex(rgb))
+                    estilo.pattern = xlwt.Pattern()
+                    estilo.pattern.pattern = xlwt.Pattern.SOLID_PATTERN
+                    estilo.pattern.pattern_fore_colour = paleta[rgb]
+                if fecha:
+                    estilo.num_format_str = 'dd/mm/yyyy'
+                estilos[rgb, fecha] = estilo
+            if celda.value is None:
+                salida.write(celda.row - 1, celda.column - 1, style=estilos[rgb, fecha])
+            else:
+                salida.write(celda.row - 1, celda.column - 1, celda.value, estilos[rgb, fecha])
+    libro.save(str(destino))
+    return destino
+
+
+@pytest.mark.parametrize('semilla', [1, 2, 3])
+def test_xls_igual_a_su_xlsx(tmp_path, semilla):
+    pytest.importorskip('xlrd')
+    xlsx = generar(tmp_path / 'f.xlsx', semilla)
+    xls = convertir_a_xls(xlsx, tmp_path / 'f.xls')
+    assert tipo_libro(xls) == 'xls'
+    assert sin_origen(extraer(tmp_path, xls)) == sin_origen(extraer(tmp_path, xlsx))
+
+
+def test_xlsx_con_extension_xls_se_lee_por_su_firma(tmp_path):
+    xlsx = generar(tmp_path / 'f.xlsx', semilla=4)
+    renombrado = shutil.copy(xlsx, tmp_path / 'renombrado.xls')
+    assert tipo_libro(renombrado) == 'xlsx'
+    reg = extraer(tmp_path, renombrado)
+    assert reg['archivo_origen'] == 'renombrado.xls'
+    assert sin_origen(reg) == sin_origen(extraer(tmp_path, xlsx))
+
+
+def test_archivo_basura_queda_en_cuarentena_por_formato(tmp_path, capfd):
+    carpeta = tmp_path / 'carpeta'
+    carpeta.mkdir()
+    generar(carpeta / 'bueno.xlsx', semilla=5)
+    (carpeta / 'roto.xlsx').write_bytes(b'esto no es un libro de Excel' * 10)
+    salida = tmp_path / 'salida.csv'
+    extraer_formularios(str(carpeta), str(salida), workers=1)
+    
+    assert [fila['archivo_origen'] for fila in leer_salida(salida)] == ['bueno.xlsx']
+    with open(ruta_cuarentena(salida), encoding='utf-8') as f:
+        entradas = [json.loads(linea) for linea in f]
+    assert [(Path(e['ruta']).name, e['causa']) for e in entradas] == [('roto.xlsx', 'formato')]
+    salida_consola = capfd.readouterr()
+    assert 'Traceback' not in salida_consola.out + salida_consola.err
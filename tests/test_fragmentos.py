@@ -0,0 +1,40 @@
+import csv
+
+import pytest
+
+from ExtractorD import extraer_formularios, fusionar_salidas, leer_salida
+
+
+def filas(ruta):
+    return sorted(leer_salida(ruta), key=lambda fila: fila['archivo_origen'])
+
+
+@pytest.mark.parametrize('extension', ['.csv', '.xlsx', '.parquet'])
+def test_fragmentos_y_fusion_dan_la_salida_completa(corpus, tmp_path, extension):
+    if extension == '.parquet':
+        pytest.importorskip('pyarrow')
+    completa = tmp_path / f'completa{extension}'
+    extraer_formularios(str(corpus), str(completa), workers=1, incremental=False)
+    
+    parciales = []
+    for i in range(3):
+        parcial = tmp_path / f'parte_{i}{extension}'
+        extraer_formularios(str(corpus), str(parcial), workers=1, incremental=False, fragmento=(i, 3))
+        if parcial.exists():
+            parciales.append(str(parcial))
+    nombres = [fila['archivo_origen'] for p in parciales for fila in leer_salida(p)]
+    assert sorted(nombres) == sorted({fila['archivo_origen'] for fila in filas(completa)})
+    
+    fusionada = tmp_path / f'fusionada{extension}'
+    fusionar_salidas(parciales, str(fusionada))
+    assert filas(fusionada) == filas(completa)
+
+
+def test_fusion_sin_duplicados(corpus, tmp_path):
+    parcial = tmp_path / 'parte.csv'
+    extraer_formularios(str(corpus), str(parcial), workers=1, incremental=False, fragmento=(0, 2))
+    fusionada = tmp_path / 'fusionada.csv'
+    fusionar_salidas([str(parcial), str(parcial)], str(fusionada))
+    with open(fusionada, encoding='utf-8-sig', newline='') as f:
+        nombres = [fila['archivo_origen'] for fila in csv.DictReader(f)]
+    assert sorted(nombres) == sorted(fila['archivo_origen'] for fila in leer_salida(parcial))
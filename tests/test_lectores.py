@@ -0,0 +1,17 @@
+import io
+import contextlib
+
+import pytest
+
+from ExtractorD import ExtractorFormulariosCompleto
+
+
+@pytest.mark.parametrize('filas_cabecera', [None, 40], ids=['hoja_completa', 'cabecera_y_cola'])
+def test_ooxml_igual_a_openpyxl(corpus, filas_cabecera):
+    base = ExtractorFormulariosCompleto(corpus, filas_cabecera=filas_cabecera)
+    ooxml = ExtractorFormulariosCompleto(corpus, filas_cabecera=filas_cabecera, lector='ooxml')
+    with contextlib.redirect_stdout(io.StringIO()):
+        for archivo in base.listar_archivos():
+            esperado = base.extraer_archivo(archivo)
+            assert esperado is not None
+            assert ooxml.extraer_archivo(archivo) == esperado, archivo.name
@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from ExtractorD import convertir_monto, normalizar_lote, normalizar_montos
+
+MONTOS = {
+    '1.234': Decimal('1234.00'),
+    '1.234.567': Decimal('1234567.00'),
+    '1234.5678': Decimal('1234.57'),
+    '1,234.56': Decimal('1234.56'),
+    '1.234,56': Decimal('1234.56'),
+    '2500.125': Decimal('2500.13'),
+    '1234.501': Decimal('1234.50'),
+    '0.30000000000000004': Decimal('0.30'),
+    '$ 1.234,50': Decimal('1234.50'),
+    '120,5': Decimal('120.50'),
+    '1,234': Decimal('1234.00'),
+    '$ 500': Decimal('500.00'),
+    '12.34.5': None,
+    '1.23,45': None,
+    '1,234.567.89': None,
+    'N/T': None,
+}
+
+
+@pytest.mark.parametrize('texto, esperado', MONTOS.items())
+def test_convertir_monto(texto, esperado):
+    assert convertir_monto(texto) == esperado
+
+
+def test_normalizar_montos_igual_a_convertir_monto():
+    serie = pd.Series(list(MONTOS) + [None, '', '  '], dtype=object)
+    montos, validos = normalizar_montos(serie)
+    esperados = [convertir_monto(t) if t and t.strip() else None for t in serie]
+    assert list(montos) == esperados
+    assert list(validos) == [m is not None for m in esperados]
+
+
+def test_normalizar_lote_no_valida_montos_inflados():
+    df = normalizar_lote(pd.DataFrame({'CUPO': ['2500.125', '12.34.5'], 'VENCIDA': ['1234.5678', None]},
+                                      dtype=object))
+    assert list(df['CUPO']) == [Decimal('2500.13'), None]
+    assert list(df['CUPO_VALIDO']) == [True, False]
+    assert list(df['VENCIDA']) == [Decimal('1234.57'), None]
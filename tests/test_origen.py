@@ -0,0 +1,44 @@
+import csv
+
+from conftest import generar
+from ExtractorD import fusionar_salidas, main
+
+
+def nombres(ruta):
+    with open(ruta, encoding='utf-8-sig', newline='') as f:
+        return sorted(fila['archivo_origen'] for fila in csv.DictReader(f))
+
+
+def test_mismo_nombre_en_subcarpetas(tmp_path):
+    raiz = tmp_path / 'raiz'
+    for k, sub in enumerate(['norte', 'sur']):
+        (raiz / sub).mkdir(parents=True)
+        generar(raiz / sub / 'FORMULARIO.xlsx', semilla=10 + k)
+    generar(raiz / 'suelto.xlsx', semilla=12)
+    salida = tmp_path / 'salida.csv'
+    assert main(['extraer', str(raiz), '-r', '-o', str(salida), '-w', '1', '--completo', '-q']) == 0
+    assert nombres(salida) == ['norte/FORMULARIO.xlsx', 'suelto.xlsx', 'sur/FORMULARIO.xlsx']
+    
+    # Los fragmentos usan los mismos valores, así que la fusión tampoco pierde filas
+    parciales = []
+    for i in range(2):
+        parcial = tmp_path / f'parte_{i}.csv'
+        main(['extraer', str(raiz), '-r', '-o', str(parcial), '-w', '1', '--completo', '-q',
+              '--shard', f'{i}/2'])
+        if parcial.exists():
+            parciales.append(str(parcial))
+    fusionada = tmp_path / 'fusionada.csv'
+    fusionar_salidas(parciales, str(fusionada))
+    assert nombres(fusionada) == nombres(salida)
+
+
+def test_mismo_nombre_en_varias_raices(tmp_path):
+    raices = []
+    for k, nombre in enumerate(['enero', 'febrero']):
+        raiz = tmp_path / 'datos' / nombre
+        raiz.mkdir(parents=True)
+        generar(raiz / 'FORMULARIO.xlsx', semilla=20 + k)
+        raices.append(str(raiz))
+    salida = tmp_path / 'salida.csv'
+    assert main(['extraer', *raices, '-o', str(salida), '-w', '1', '--completo', '-q']) == 0
+    assert nombres(salida) == ['enero/FORMULARIO.xlsx', 'febrero/FORMULARIO.xlsx']
@@ -0,0 +1,74 @@
+import io
+import contextlib
+import tarfile
+import zipfile
+
+import pytest
+
+import ExtractorD
+from ExtractorD import ExtractorFormulariosCompleto, extraer_formularios, leer_salida
+
+
+def empaquetar(corpus, ruta):
+    """Paquete con los formularios del corpus en lote/, más un archivo oculto que se ignora."""
+    archivos = sorted(corpus.glob('*.xlsx'))[:4]
+    if ruta.suffix == '.zip':
+        with zipfile.ZipFile(ruta, 'w') as z:
+            for archivo in archivos:
+                z.write(archivo, f'lote/{archivo.name}')
+            z.writestr('__MACOSX/lote/._x.xlsx', b'basura')
+    else:
+        with tarfile.open(ruta, 'w:gz' if ruta.name.endswith('.gz') else 'w') as t:
+            for archivo in archivos:
+                t.add(archivo, f'./lote/{archivo.name}')
+    return archivos
+
+
+def sin_origen(fila):
+    return {k: v for k, v in fila.items() if k != 'archivo_origen'}
+
+
+@pytest.mark.parametrize('nombre', ['pkg.zip', 'pkg.tar', 'pkg.tar.gz'])
+@pytest.mark.parametrize('workers', [1, 2])
+def test_miembros_de_paquete(corpus, tmp_path, nombre, workers):
+    paquete = tmp_path / nombre
+    archivos = empaquetar(corpus, paquete)
+    salida = tmp_path / 'salida.csv'
+    extraer_formularios(str(paquete), str(salida), workers=workers, incremental=False)
+    filas = {fila['archivo_origen']: fila for fila in leer_salida(salida)}
+    assert sorted(filas) == [f'{nombre}::lote/{archivo.name}' for archivo in archivos]
+    
+    sueltos = tmp_path / 'sueltos.csv'
+    extraer_formularios(str(corpus), str(sueltos), workers=1, incremental=False)
+    for fila in leer_salida(sueltos):
+        empaquetada = filas.get(f"{nombre}::lote/{fila['archivo_origen']}")
+        if empaquetada is not None:
+            assert sin_origen(empaquetada) == sin_origen(fila)
+    assert ExtractorD._paquete_abierto is None  # El paquete se cerró al terminar
+
+
+def test_cambio_de_paquete_cierra_el_anterior(corpus, tmp_path):
+    primero, segundo = tmp_path / 'a.zip', tmp_path / 'b.zip'
+    empaquetar(corpus, primero)
+    empaquetar(corpus, segundo)
+    miembros = [next(ExtractorD.recorrer_paquete(p)) for p in (primero, segundo)]
+    miembros[0].read_bytes()
+    abierto = ExtractorD._paquete_abierto[2]
+    miembros[1].read_bytes()
+    assert abierto.fp is None  # ZipFile cerrado
+    ExtractorD.cerrar_paquete()
+    assert ExtractorD._paquete_abierto is None
+
+
+def test_bytes_en_memoria(corpus):
+    archivo = sorted(corpus.glob('*.xlsx'))[0]
+    extractor = ExtractorFormulariosCompleto(corpus)
+    with contextlib.redirect_stdout(io.StringIO()):
+        esperado = extractor.extraer_archivo(archivo)
+        desde_bytes = extractor.extraer_archivo(archivo.read_bytes())
+        adjunto = io.BytesIO(archivo.read_bytes())
+        adjunto.name = 'adjunto.xlsx'
+        desde_objeto = extractor.extraer_archivo(adjunto)
+    assert desde_bytes['archivo_origen'] == 'formulario.xlsx'
+    assert desde_objeto['archivo_origen'] == 'adjunto.xlsx'
+    assert sin_origen(desde_bytes) == sin_origen(desde_objeto) == sin_origen(esperado)
@@ -0,0 +1,76 @@
+import io
+import contextlib
+
+import openpyxl
+
+import ExtractorD
+from conftest import generar
+from ExtractorD import ClasificadorRellenos, ExtractorFormulariosCompleto, GrillaHoja, PlantillasCache, huella_plantilla
+
+
+def grilla(ruta):
+    hoja = openpyxl.load_workbook(ruta, read_only=True, data_only=True).active
+    hoja.reset_dimensions()
+    return GrillaHoja.desde_hoja(hoja, ClasificadorRellenos())
+
+
+def test_huella_no_depende_de_los_datos(tmp_path):
+    ruta = generar(tmp_path / 'a.xlsx', semilla=5)
+    antes = huella_plantilla(grilla(ruta))
+    wb = openpyxl.load_workbook(ruta)
+    for fila in wb.active.iter_rows():
+        for celda in fila:
+            if celda.value == 'NOMBRE':
+                wb.active.cell(celda.row, celda.column + 1).value = 'GARANTE: RIESGO TOTAL'
+    wb.save(ruta)
+    assert huella_plantilla(grilla(ruta)) == antes
+
+
+def test_plantillas_dan_los_mismos_registros(tmp_path):
+    # Mismas anclas con filas movidas debajo: los campos afectados se buscan de nuevo
+    for k in range(20):
+        generar(tmp_path / f'f{k:02}.xlsx', semilla=100 + k, filas_anexo=200 if k == 3 else 0)
+    cache = PlantillasCache()
+    con = ExtractorFormulariosCompleto(tmp_path, plantillas=cache)
+    sin = ExtractorFormulariosCompleto(tmp_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(2):
+            for archivo in sin.listar_archivos():
+                assert con.extraer_archivo(archivo) == sin.extraer_archivo(archivo)
+    assert len(cache.plantillas) < 20
+
+
+def test_cache_descarta_la_menos_usada(tmp_path):
+    cache = PlantillasCache(tmp_path / 'plantillas.jsonl', maximo=2)
+    cache.guardar('a', [], {})
+    cache.guardar('b', [], {})
+    cache.buscar('a')
+    cache.guardar('c', [], {})
+    assert list(cache.plantillas) == ['a', 'c']
+    cache.compactar()
+    assert list(PlantillasCache(tmp_path / 'plantillas.jsonl', maximo=2).plantillas) == ['a', 'c']
+
+
+def test_acierto_no_recorre_toda_la_grilla(tmp_path, monkeypatch):
+    # Mismo diseño, otros datos: sólo el primero recorre todas las celdas
+    base = generar(tmp_path / 'base.xlsx', semilla=42)
+    carpeta = tmp_path / 'variantes'
+    carpeta.mkdir()
+    for k in range(5):
+        wb = openpyxl.load_workbook(base)
+        for fila in wb.active.iter_rows():
+            for celda in fila:
+                if isinstance(celda.value, int):
+                    celda.value = celda.value + k
+        wb.save(carpeta / f'v{k}.xlsx')
+    
+    recorridos = []
+    original = ExtractorD.celdas_plantilla
+    monkeypatch.setattr(ExtractorD, 'celdas_plantilla',
+                        lambda *args, **kwargs: recorridos.append(1) or original(*args, **kwargs))
+    con = ExtractorFormulariosCompleto(carpeta, plantillas=PlantillasCache())
+    sin = ExtractorFormulariosCompleto(carpeta)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for archivo in sin.listar_archivos():
+            assert con.extraer_archivo(archivo) == sin.extraer_archivo(archivo)
+    assert len(recorridos) == 1